@@ -37,7 +37,7 @@ def read_uijkl(path_to_uijkl):
     uijkl = np.zeros((dim,dim,dim,dim), dtype=complex)
  
     for line in range(data.shape[0]):
-        idxs = tuple(np.array(data[line, :4], dtype=np.int) - 1)
+        idxs = tuple(np.array(data[line, :4], dtype=int) - 1)
         uijkl[idxs] = data[line,4] + 1.j * data[line, 5]
 
     return uijkl
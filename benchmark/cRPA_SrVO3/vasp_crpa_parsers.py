@@ -22,7 +22,7 @@ def read_vasp_crpa_momentum_space_interaction_to_ndarray(path, prefix, verbose=F
             data = np.vstack((data, d))
 
     q = data[:, :3]
-    idxs = np.array(data[:, 3:7], dtype=np.int)
+    idxs = np.array(data[:, 3:7], dtype=int)
     vals = data[:, 7] + 1.j * data[:, 8]
 
     norb = idxs.max()
@@ -30,7 +30,7 @@ def read_vasp_crpa_momentum_space_interaction_to_ndarray(path, prefix, verbose=F
 
     if verbose: print('norb, nq =', norb, nq)
 
-    Q = np.zeros((nq, 3), dtype=np.float)
+    Q = np.zeros((nq, 3), dtype=float)
     U_Q = np.zeros((nq, norb, norb, norb, norb), dtype=complex)
     
     for qidx in range(nq):
@@ -61,7 +61,7 @@ def convert_from_ndarray_to_triqs(U_Q, Q, cell, kpts):
 
     u_q = Gf(mesh=bzmesh, target_shape=U_Q.shape[1:])
 
-    tmp = np.array(Q * kpts[None, :], dtype=np.int)
+    tmp = np.array(Q * kpts[None, :], dtype=int)
     I = [tuple(tmp[i]) for i in range(Q.shape[0])]
 
     for qidx, i in enumerate(I):
@@ -71,7 +71,7 @@ def convert_from_ndarray_to_triqs(U_Q, Q, cell, kpts):
             a = cell[0, 0]
             q = k * 0.5 * a / np.pi
 
-            j = tuple(np.array(kpts * q, dtype=np.int))
+            j = tuple(np.array(kpts * q, dtype=int))
             if i == j: u_q[k].data[:] = U_Q[qidx]
 
     return u_q
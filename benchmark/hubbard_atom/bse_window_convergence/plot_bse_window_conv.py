@@ -15,7 +15,7 @@ from triqs_tprf.analytic_hubbard_atom import analytic_hubbard_atom
 if __name__ == '__main__':
 
     nwf_vec = np.array([5, 10, 20, 40, 80, 160])
-    diff_vec = np.zeros_like(nwf_vec, dtype=np.float)
+    diff_vec = np.zeros_like(nwf_vec, dtype=float)
 
     for idx, nwf in enumerate(nwf_vec):
          d = analytic_hubbard_atom(beta=2.0, U=5.0, nw=1, nwf=nwf, nwf_gf=2*nwf)
@@ -88,7 +88,7 @@ def max_abs_diff_in_window(g2_a, g2_b, nwf):
 def window_conv_depr():
 
     nwf_vec = np.array([5, 10, 20, 40, 80, 160, 320])
-    diff_vec = np.zeros_like(nwf_vec, dtype=np.float)
+    diff_vec = np.zeros_like(nwf_vec, dtype=float)
 
     for idx, nwf in enumerate(nwf_vec):
          d = analytic_solution(beta=2.0, U=5.0, nw=1, nwf=nwf)
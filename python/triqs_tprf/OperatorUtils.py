@@ -180,7 +180,7 @@ def symmetrize_quartic_tensor(U, conjugation=False):
 
     # -- Pauli principle
     
-    #for n in xrange(N):
+    #for n in range(N):
     #    U[n, n, :, :] = 0
     #    U[:, :, n, n] = 0
 
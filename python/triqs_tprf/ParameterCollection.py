@@ -45,14 +45,14 @@ class ParameterCollection(object):
     dot operator.
 
     >>> p = ParameterCollection(beta=10., U=1.0, t=1.0)
-    >>> print p
+    >>> print(p)
     U = 1.0
     beta = 10.0
     t = 1.0
-    >>> print p.beta
+    >>> print(p.beta)
     10.0
     >>> p.W = 1.2
-    >>> print p
+    >>> print(p)
     U = 1.0
     W = 1.2
     beta = 10.0
@@ -63,7 +63,7 @@ class ParameterCollection(object):
     >>> from h5 import HDFArchive
     >>> with HDFArchive('data.h5', 'w') as arch: arch['p'] = p
     >>> with HDFArchive('data.h5', 'r') as arch: p_ref = arch['p']
-    >>> print p_ref
+    >>> print(p_ref)
     U = 1.0
     beta = 10.0
     t = 1.0
@@ -195,9 +195,9 @@ class ParameterCollections(object):
     >>> p1 = ParameterCollection(beta=10., U=1.0, t=1.0)
     >>> p2 = ParameterCollection(beta=5., U=2.0, t=1.337)
     >>> ps = ParameterCollections(objects=[p1, p2])
-    >>> print ps.beta
+    >>> print(ps.beta)
     [10.  5.]
-    >>> print ps.U
+    >>> print(ps.U)
     [1. 2.]
 
     """
@@ -279,15 +279,15 @@ def parameter_scan(p, **kwargs):
     --------
     >>> p = ParameterCollection(beta=10., U=1.0, t=1.0)
     >>> ps = parameter_scan(p, U=[1.0, 1.5, 2.0])
-    >>> print ps[0]
+    >>> print(ps[0])
     U = 1.0
     beta = 10.0
     t = 1.0
-    >>> print ps[1]
+    >>> print(ps[1])
     U = 1.5
     beta = 10.0
     t = 1.0
-    >>> print ps[2]
+    >>> print(ps[2])
     U = 2.0
     beta = 10.0
     t = 1.0
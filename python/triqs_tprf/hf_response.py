@@ -33,11 +33,12 @@ import sys
 import itertools
 import numpy as np
 from .numpy_compat import np_eigh
+from .hf_solver import fermi, fermi_density_matrix, k_blocks
 
 # ----------------------------------------------------------------------
 class BaseResponse(object):
 
-    def __init__(self, solver, eps=1e-9):
+    def __init__(self, solver, eps=None):
 
         print(self.logo())
         
@@ -63,94 +64,195 @@ class BaseResponse(object):
         print('shape_abcd =', self.shape_abcd)
         print('shape_AB =', self.shape_AB)
         print('beta =', self.beta)
+        print('eps =', self.eps)
+
+        if self.eps is None:
+            self._setup_lehmann_kernel()
+        
+    # ------------------------------------------------------------------
+    def _setup_lehmann_kernel(self, tol=1e-6):
+        r""" Eigen decomposition of the unperturbed dispersion and the
+        Lindhard kernel :math:`K_{k, mn} = (f_{km} - f_{kn})/(e_{km} - e_{kn})`,
+        using :math:`f'((e_{km} + e_{kn})/2)` for (near) degenerate states. """
+
+        beta = self.beta
+
+        e, U = np_eigh(self.e_k.data)
+        f = fermi(e, beta)
+
+        de = e[:, :, None] - e[:, None, :]
+        df = f[:, :, None] - f[:, None, :]
+
+        degenerate = np.abs(beta * de) < tol
+        de[degenerate] = 1.
+
+        f_mid = fermi(0.5*(e[:, :, None] + e[:, None, :]), beta)
         
+        self.U_kab = U
+        self.K_kab = np.where(degenerate, -beta * f_mid * (1. - f_mid), df / de)
+
     # ------------------------------------------------------------------
     def _compute_drho_dop(self, op):
+        return self._compute_drho_dops(op[None, ...])[0]
+
+    # ------------------------------------------------------------------
+    def _compute_drho_k_dop(self, op):
+        return self._compute_drho_k_dops(op[None, ...])[0]
+
+    # ------------------------------------------------------------------
+    def _perturbed_dispersion(self, ops, kb=slice(None)):
+        """ Dispersion perturbed by all the operators ops[F, a, b] at once,
+        for both signs of the finite difference step
 
-        drho_k = self._compute_drho_k_dop(op)
-        drho = np.sum(drho_k, axis=0) / self.n_k
+        E[s, F, k, a, b] = e_k[k, a, b] + (-1)^s * eps * ops[F, a, b]
+
+        restricted to the momentum block kb.
+        """
+
+        e_k = self.e_k.data[kb]
+        E = np.empty((2, ops.shape[0]) + e_k.shape, dtype=complex)
+
+        eps_ops = self.eps * ops[:, None, ...]
+        np.add(e_k[None, ...], eps_ops, out=E[0])
+        np.subtract(e_k[None, ...], eps_ops, out=E[1])
+
+        return E
+
+    # ------------------------------------------------------------------
+    def _compute_drho_dops(self, ops):
+
+        if self.eps is not None:
+            return self._compute_drho_dops_finite_difference(ops)
+
+        # -- Accumulate over blocks of k, bounding the (F, k, a, b) temporaries
+        drho = np.zeros((ops.shape[0],) + tuple(self.shape_ab), dtype=complex)
+        for kb in k_blocks(self.n_k, ops.shape[0] * self.norb**2 * 16):
+            drho += np.sum(self._compute_drho_k_dops_lehmann(ops, kb), axis=1)
+
+        drho /= self.n_k
 
         return drho
 
     # ------------------------------------------------------------------
-    def _compute_drho_k_dop(self, op):
+    def _compute_drho_k_dops(self, ops):
 
-        beta, eps = self.beta, self.eps
-        
-        E_p = self.e_k.data.copy() + eps*op[None, ...]
-        E_m = self.e_k.data.copy() - eps*op[None, ...]
+        if self.eps is not None:
+            return self._compute_drho_k_dops_finite_difference(ops)
 
-        e_p, U_p = np_eigh(E_p)
-        e_m, U_m = np_eigh(E_m)
+        return self._compute_drho_k_dops_lehmann(ops)
 
-        fermi = lambda e, beta: 1./(np.exp(beta * e) + 1)
+    # ------------------------------------------------------------------
+    def _compute_drho_k_dops_lehmann(self, ops, kb=slice(None)):
 
-        rho_k_p = np.einsum('kab,kb,kcb->kac', U_p, fermi(e_p, beta), np.conj(U_p))
-        rho_k_m = np.einsum('kab,kb,kcb->kac', U_m, fermi(e_m, beta), np.conj(U_m))
+        U, K = self.U_kab[kb], self.K_kab[kb]
+        U_dag = np.conj(U).swapaxes(-1, -2)
 
-        drho_k = (rho_k_p - rho_k_m) / (2. * eps)
+        # -- Batched matrix products, rotate to the eigen basis and back
+        F_Fkmn = U_dag[None, ...] @ ops[:, None, ...] @ U[None, ...]
+        drho_k = U[None, ...] @ (K[None, ...] * F_Fkmn) @ U_dag[None, ...]
 
         return drho_k
 
-    # ----------------------------------------------------------------------
-    def _compute_chi0_ab(self):
+    # ------------------------------------------------------------------
+    def _fd_k_blocks(self, ops):
+        """ Blocks of k bounding the perturbed dispersion E[s, F, k, a, b] """
+        return k_blocks(self.n_k, 2 * ops.shape[0] * self.norb**2 * 16)
 
-        chi0_ab = np.zeros(self.shape_ab, dtype=complex)
+    # ------------------------------------------------------------------
+    def _compute_drho_dops_finite_difference(self, ops):
 
-        for a in range(self.norb):
-            F_a = np.zeros(self.shape_ab)
-            F_a[a, a] = 1.
+        drho = np.zeros((ops.shape[0],) + tuple(self.shape_ab), dtype=complex)
+        for kb in self._fd_k_blocks(ops):
+            E = self._perturbed_dispersion(ops, kb)
+            rho_p, rho_m = fermi_density_matrix(E, self.beta)
+            drho += E.shape[2] * (rho_p - rho_m)
 
-            chi0_b = -np.diag(self._compute_drho_dop(F_a))
-            chi0_ab[a] = chi0_b
+        drho /= 2. * self.eps * self.n_k
 
-        return chi0_ab
+        return drho
+
+    # ------------------------------------------------------------------
+    def _compute_drho_k_dops_finite_difference(self, ops):
+
+        drho_k = np.empty((ops.shape[0], self.n_k) + tuple(self.shape_ab), dtype=complex)
+        for kb in self._fd_k_blocks(ops):
+            rho_k_p, rho_k_m = fermi_density_matrix(
+                self._perturbed_dispersion(ops, kb), self.beta, k_sum=False)
+            drho_k[:, kb] = (rho_k_p - rho_k_m) / (2. * self.eps)
+
+        return drho_k
 
     # ----------------------------------------------------------------------
-    def _compute_R_abcd(self, field_prefactor=1.):
+    def _get_field_operators(self, field_prefactor=1.):
+        """ All norb**2 field operators F_ab as one array ops[ab, :, :] """
+
+        idx = np.arange(self.norb**2)
+        a, b = np.divmod(idx, self.norb)
 
-        R_abcd = np.zeros(self.shape_abcd, dtype=complex)
+        ops = np.zeros([len(idx)] + list(self.shape_ab), dtype=complex)
+        ops[idx, a, b] += field_prefactor
+        ops[idx, b, a] += np.conj(field_prefactor)
+
+        return ops
+
+    # ----------------------------------------------------------------------
+    def _compute_chi0_ab(self):
 
-        for a, b in itertools.product(list(range(self.norb)), repeat=2):
+        idx = np.arange(self.norb)
+        ops = np.zeros([self.norb] + list(self.shape_ab))
+        ops[idx, idx, idx] = 1.
 
-            F_ab = np.zeros(self.shape_ab, dtype=complex)
-            F_ab[a, b] += field_prefactor
-            F_ab[b, a] += np.conj(field_prefactor)
+        drho = self._compute_drho_dops(ops)
+        chi0_ab = -np.diagonal(drho, axis1=-2, axis2=-1)
 
-            R_cd = -self._compute_drho_dop(F_ab)
-            R_abcd[b, a, :, :] = R_cd
+        return chi0_ab
 
-        return R_abcd
+    # ----------------------------------------------------------------------
+    def _get_field_operators_stack(self, field_prefactor):
+        """ Field operators for one or several prefactors, in one ops array """
+        return np.concatenate([
+            self._get_field_operators(p) for p in np.atleast_1d(field_prefactor)])
 
     # ----------------------------------------------------------------------
-    def _compute_R_kabcd(self, field_prefactor=1.):
+    def _compute_R_abcd(self, field_prefactor=1.):
+        """ For a sequence of field prefactors all responses are computed
+        in a single pass and R_abcd gets a leading prefactor index. """
+
+        n_p = np.size(field_prefactor)
+        ops = self._get_field_operators_stack(field_prefactor)
+        
+        R_abcd = -self._compute_drho_dops(ops).reshape([n_p] + self.shape_abcd)
+        R_abcd = np.ascontiguousarray(R_abcd.swapaxes(1, 2)) # F_ab -> R_ba..
 
-        R_kabcd = np.zeros(self.shape_kabcd, dtype=complex)
+        return R_abcd if np.ndim(field_prefactor) else R_abcd[0]
 
-        for a, b in itertools.product(list(range(self.norb)), repeat=2):
+    # ----------------------------------------------------------------------
+    def _compute_R_kabcd(self, field_prefactor=1.):
+        """ See _compute_R_abcd for sequences of field prefactors. """
 
-            F_ab = np.zeros(self.shape_ab, dtype=complex)
-            F_ab[a, b] += field_prefactor
-            F_ab[b, a] += np.conj(field_prefactor)
+        n_p = np.size(field_prefactor)
+        ops = self._get_field_operators_stack(field_prefactor)
 
-            R_kcd = -self._compute_drho_k_dop(F_ab)
-            R_kabcd[:, b, a, :, :] = R_kcd
+        R_kabcd = -self._compute_drho_k_dops(ops).reshape(
+            [n_p] + list(self.shape_ab) + [self.n_k] + list(self.shape_ab))
+        R_kabcd = np.ascontiguousarray(
+            R_kabcd.transpose(0, 3, 2, 1, 4, 5)) # F_ab -> R_kba..
 
-        return R_kabcd
+        return R_kabcd if np.ndim(field_prefactor) else R_kabcd[0]
     
     # ----------------------------------------------------------------------
     def _compute_chi0_abcd(self):
 
-        chi0_kabcd = self._compute_chi0_kabcd()
-        chi0_abcd = np.sum(chi0_kabcd, axis=0) / self.n_k
+        R_r_abcd, R_i_abcd = self._compute_R_abcd(field_prefactor=(1.0, 1.j))
+
+        chi0_abcd = 0.5 * (R_r_abcd + R_i_abcd.imag)
 
         return chi0_abcd
 
     # ----------------------------------------------------------------------
     def _compute_chi0_kabcd(self):
 
-        R_r_kabcd = self._compute_R_kabcd(field_prefactor=1.0) 
-        R_i_kabcd = self._compute_R_kabcd(field_prefactor=1.j)
+        R_r_kabcd, R_i_kabcd = self._compute_R_kabcd(field_prefactor=(1.0, 1.j))
 
         chi0_kabcd = 0.5 * (R_r_kabcd + R_i_kabcd.imag)
 
@@ -187,21 +289,29 @@ class HartreeFockResponse(BaseResponse):
     hartree_fock_solver : HartreeFockSolver instance
         Converged Hartree-Fock solver.
 
-    eps : float
+    eps : float, optional
         Step size in finite difference linear response calculation.
+        If None (default) the response is computed analytically using
+        the Lehmann representation.
 
     """
     
-    def __init__(self, hartree_fock_solver, eps=1e-9):
+    def __init__(self, hartree_fock_solver, eps=None):
 
-        super(HartreeFockResponse, self).__init__(hartree_fock_solver)
+        super(HartreeFockResponse, self).__init__(hartree_fock_solver, eps=eps)
         self.hfs = self.solver
         
-        I_AB = np.matrix(np.eye(self.shape_AB[0]))
+        I_AB = np.eye(self.shape_AB[0])
         U_AB = self._to_matrix_AB(self.hfs.U_abcd)
         chi0_AB = self._to_matrix_AB(self._compute_chi0_abcd())
 
-        chi_AB = np.linalg.inv(I_AB - chi0_AB * U_AB) * chi0_AB
+        chi_AB = np.linalg.solve(I_AB - chi0_AB @ U_AB, chi0_AB)
+
+        # -- Keep the matrix forms, operator contractions are done as
+        # -- matrix-vector products with the flattened operators.
+        self.U_AB = U_AB
+        self.chi0_AB = chi0_AB
+        self.chi_AB = chi_AB
 
         self.chi0_abcd = self._to_tensor_abcd(chi0_AB)
         self.chi_abcd = self._to_tensor_abcd(chi_AB)
@@ -212,10 +322,7 @@ class HartreeFockResponse(BaseResponse):
 
     def mode_decomposition(self):
         
-        U_AB = self._to_matrix_AB(self.hfs.U_abcd)
-        chi0_AB = self._to_matrix_AB(self.chi0_abcd)
-
-        e = np.linalg.eigvals(np.mat(chi0_AB) * np.mat(U_AB))
+        e = np.linalg.eigvals(self.chi0_AB @ self.U_AB)
         
         idx = np.argsort(e.real)
         e = e[idx]
@@ -224,11 +331,11 @@ class HartreeFockResponse(BaseResponse):
         return e
         
     def _to_matrix_AB(self, tensor_abcd):
-        matrix_AB = np.matrix(tensor_abcd.reshape(self.shape_AB))
+        matrix_AB = tensor_abcd.reshape(self.shape_AB)
         return matrix_AB
 
     def _to_tensor_abcd(self, matrix_AB):
-        tensor_abcd = np.array(matrix_AB).reshape(self.shape_abcd)
+        tensor_abcd = matrix_AB.reshape(self.shape_abcd)
         return tensor_abcd
     
     def __check_op(self, op):
@@ -239,7 +346,7 @@ class HartreeFockResponse(BaseResponse):
         self.__check_op(op1)
         self.__check_op(op2)
         
-        chi0_op1op2 = np.einsum('ab,abcd,cd->', op1, self.chi0_abcd, op2)
+        chi0_op1op2 = op1.flatten() @ self.chi0_AB @ op2.flatten()
 
         return chi0_op1op2
 
@@ -248,7 +355,7 @@ class HartreeFockResponse(BaseResponse):
         self.__check_op(op1)
         self.__check_op(op2)
         
-        chi_op1op2 = np.einsum('ab,abcd,cd->', op1, self.chi_abcd, op2)
+        chi_op1op2 = op1.flatten() @ self.chi_AB @ op2.flatten()
 
         return chi_op1op2
 
@@ -272,22 +379,26 @@ class HartreeResponse(BaseResponse):
     hartree_solver : HartreeSolver instance
         Converged Hartree solver.
 
-    eps : float
+    eps : float, optional
         Step size in finite difference linear response calculation.
+        If None (default) the response is computed analytically using
+        the Lehmann representation.
 
     """
     
-    def __init__(self, hartree_solver, eps=1e-9):
+    def __init__(self, hartree_solver, eps=None):
 
-        super(HartreeResponse, self).__init__(hartree_solver)
+        super(HartreeResponse, self).__init__(hartree_solver, eps=eps)
         
         I_ab = np.eye(self.norb)
-        U_ab = np.mat(self.extract_dens_dens(self.solver.U_abcd))
-        chi0_ab = np.mat(self._compute_chi0_ab())
-        chi_ab = chi0_ab * np.linalg.inv(I_ab - U_ab * chi0_ab)
+        U_ab = self.extract_dens_dens(self.solver.U_abcd)
+        chi0_ab = self._compute_chi0_ab()
+
+        # chi0 (1 - U chi0)^{-1} = (1 - chi0 U)^{-1} chi0
+        chi_ab = np.linalg.solve(I_ab - chi0_ab @ U_ab, chi0_ab)
 
-        self.chi0_ab = np.array(chi0_ab)
-        self.chi_ab = np.array(chi_ab)
+        self.chi0_ab = chi0_ab
+        self.chi_ab = chi_ab
 
     def __check_op(self, op):
         """ Operators have to be diagonal in the Hartree approx """
@@ -301,7 +412,7 @@ class HartreeResponse(BaseResponse):
         self.__check_op(op1)
         self.__check_op(op2)
         
-        chi0_op1op2 = np.einsum('aa,ab,bb->', op1, self.chi0_ab, op2)
+        chi0_op1op2 = np.diag(op1) @ self.chi0_ab @ np.diag(op2)
 
         return chi0_op1op2
 
@@ -310,7 +421,7 @@ class HartreeResponse(BaseResponse):
         self.__check_op(op1)
         self.__check_op(op2)
         
-        chi_op1op2 = np.einsum('aa,ab,bb->', op1, self.chi_ab, op2)
+        chi_op1op2 = np.diag(op1) @ self.chi_ab @ np.diag(op2)
 
         return chi_op1op2
 
@@ -32,6 +32,7 @@ Author: Hugo U. R. Strand, hugo.strand@gmail.com (2018)
 # ----------------------------------------------------------------------
 
 import sys
+import warnings
 import itertools
 import numpy as np
 from .numpy_compat import np_eigvalsh, np_eigh
@@ -40,6 +41,7 @@ from .numpy_compat import np_eigvalsh, np_eigh
 
 from scipy.optimize import fsolve
 from scipy.optimize import brentq
+from scipy.optimize import root_scalar
 
 # ----------------------------------------------------------------------
 
@@ -52,6 +54,86 @@ from triqs_tprf.rpa_tensor import get_rpa_tensor
 from triqs_tprf.rpa_tensor import fundamental_operators_from_gf_struct
 from triqs_tprf.OperatorUtils import is_operator_composed_of_only_fundamental_operators
 
+# ----------------------------------------------------------------------
+def fermi(e, beta):
+
+    r""" Fermi-Dirac distribution :math:`f(e) = 1/(e^{\beta e} + 1)`
+
+    evaluated as :math:`(1 - \tanh(\beta e / 2))/2`, which does not
+    overflow for large :math:`\beta |e|` and needs a single transcendental.
+    """
+
+    return 0.5 - 0.5 * np.tanh(0.5 * beta * e)
+
+# ----------------------------------------------------------------------
+def k_blocks(n_k, bytes_per_k, block_bytes=2**20):
+
+    """ Slices partitioning the momentum index in blocks of at most
+    block_bytes (default 1 MB, ~L2 cache size) of data each. """
+
+    k_block = max(1, block_bytes // bytes_per_k)
+
+    return [ slice(k, k + k_block) for k in range(0, n_k, k_block) ]
+
+# ----------------------------------------------------------------------
+def fermi_density_matrix(E, beta, mu=0., k_sum=True):
+
+    r""" Fermi-Dirac density matrix :math:`\rho = f(E - \mu)` for a stack
+    of Hermitian matrices :math:`E`.
+
+    The eigen decomposition, the Fermi function and the reconstruction
+    :math:`\rho = V f V^\dagger` are fused, by scaling the eigenvectors
+    in place with :math:`\sqrt{f}` and contracting them with themselves.
+    The momentum average is accumulated over cache sized blocks of k-points.
+
+    Parameters
+    ----------
+
+    E : ndarray
+        Hermitian matrices E[..., k, a, b].
+
+    beta : float
+        Inverse temperature.
+
+    mu : float, optional
+        Chemical potential.
+
+    k_sum : bool, optional
+        Average over the momentum index k (default True).
+
+    Returns
+    -------
+
+    rho : ndarray
+        Density matrix rho[..., a, b] if k_sum, else rho[..., k, a, b].
+
+    """
+
+    def weighted_eigenvectors(E):
+        shape = E.shape
+        e, V = np_eigh(E.reshape((-1,) + shape[-2:]))
+        e, V = e.reshape(shape[:-1]), V.reshape(shape)
+        e -= mu
+        V *= np.sqrt(fermi(e, beta))[..., None, :]
+        return V
+
+    if not k_sum:
+        V = weighted_eigenvectors(E)
+        return V @ np.conj(V).swapaxes(-1, -2)
+
+    shape = E.shape
+    rho = np.zeros(shape[:-3] + shape[-2:], dtype=complex)
+
+    for kb in k_blocks(shape[-3], E[..., 0, :, :].nbytes):
+        V = weighted_eigenvectors(E[..., kb, :, :])
+        # -- Move k into the contracted index, one GEMM per block
+        V = np.swapaxes(V, -3, -2).reshape(shape[:-3] + (shape[-2], -1))
+        rho += V @ np.conj(V).swapaxes(-1, -2)
+
+    rho /= shape[-3]
+
+    return rho
+
 # ----------------------------------------------------------------------
 class HartreeFockSolver(object):
 
@@ -141,51 +223,70 @@ class HartreeFockSolver(object):
     # ------------------------------------------------------------------
     def update_mean_field(self, rho_ab):
 
-        self.M = np.einsum('abcd,cd->ba', -self.U_abcd, rho_ab)
+        # -- M_ba = -U_abcd rho_cd as a matrix-vector product
+        U_AB = self.U_abcd.reshape(self.norb**2, self.norb**2)
+        self.M = -(U_AB @ rho_ab.flatten()).reshape(self.shape_ab).T
         
         return self.M
     
     # ------------------------------------------------------------------
     def update_mean_field_dispersion(self):
-        self.e_k_MF.data[:] = self.e_k.data + self.M[None, ...]
+        np.add(self.e_k.data, self.M[None, ...], out=self.e_k_MF.data)
 
     # ------------------------------------------------------------------
-    def update_chemical_potential(self, N_target, mu0=None):
+    def update_chemical_potential(self, N_target, mu0=None, dn_dmu_tol=1e-8):
+        r""" Solve for the chemical potential giving the density N_target.
+
+        Newton steps from mu0 use the analytic derivative
+        :math:`dn/d\mu = \beta \langle f (1 - f) \rangle_k`. When n(mu) is
+        flat at the root (gap) mu is not determined by the Newton step, then
+        the bracketed root search is used instead. The Newton root is only
+        accepted if :math:`dn/d\mu > \beta \cdot` dn_dmu_tol, i.e. if
+        the thermal weight :math:`\langle f (1 - f) \rangle_k` at the Fermi
+        level (at most 1/4 per band) is larger than dn_dmu_tol.
+        """
 
         if mu0 is None:
             mu0 = self.mu
             
-        e = np_eigvalsh(self.e_k_MF.data)
-
-        fermi = lambda e : 1./(np.exp(self.beta * e) + 1)
+        e = np_eigvalsh(self.e_k_MF.data).flatten()
 
         def target_function(mu):
-            n = np.sum(fermi(e - mu)) / self.n_k
-            return n - N_target
+            f = fermi(e - mu, self.beta)
+            n = np.sum(f) / self.n_k
+            dn_dmu = self.beta * np.sum(f * (1. - f)) / self.n_k
+            return n - N_target, dn_dmu
 
         mu_min = self.mu_min if self.mu_min is not None else e.min()
         mu_max = self.mu_max if self.mu_max is not None else e.max()
 
-        mu = brentq(target_function, mu_min, mu_max)
+        with warnings.catch_warnings():
+            warnings.filterwarnings(
+                'ignore', message='Derivative was zero', category=RuntimeWarning)
+            sol = root_scalar(target_function, x0=mu0, fprime=True,
+                              method='newton', xtol=2e-12, maxiter=20)
+
+        if sol.converged and mu_min <= sol.root <= mu_max and \
+           target_function(sol.root)[1] > dn_dmu_tol * self.beta:
+            mu = sol.root
+        else:
+            mu = brentq(lambda mu : target_function(mu)[0], mu_min, mu_max)
 
         self.mu = mu        
 
     # ------------------------------------------------------------------
     def update_momentum_density_matrix(self):
 
-        e, V = np_eigh(self.e_k_MF.data)
-        e -= self.mu
-        
-        fermi = lambda e : 1./(np.exp(self.beta * e) + 1)
-        self.rho_kab = np.einsum('kab,kb,kcb->kac', V, fermi(e), np.conj(V))
+        self.rho_kab = fermi_density_matrix(
+            self.e_k_MF.data, self.beta, mu=self.mu, k_sum=False)
 
         return self.rho_kab
 
     # ------------------------------------------------------------------
     def update_density_matrix(self):
 
-        rho_kab = self.update_momentum_density_matrix()
-        self.rho_ab = np.sum(rho_kab, axis=0) / self.n_k
+        self.rho_ab = fermi_density_matrix(
+            self.e_k_MF.data, self.beta, mu=self.mu)
         self.N_tot = np.sum(np.diag(self.rho_ab))
         
         return self.rho_ab
@@ -196,7 +297,7 @@ class HartreeFockSolver(object):
         e = np_eigvalsh(self.e_k_MF.data)
         e -= self.mu
         
-        self.Omega0 = -1./self.beta * np.sum( np.log(1. + np.exp(-self.beta*e)) )
+        self.Omega0 = -1./self.beta * np.sum( np.logaddexp(0., -self.beta*e) )
         self.Omega0 /= len(self.e_k_MF.mesh)
         
         return self.Omega0
@@ -215,7 +316,7 @@ class HartreeFockSolver(object):
 
         #self.E_int = 0.5 * np.einsum('aa,ab,bb->', self.rho, self.U_ab, self.rho)
         self.E_int = 0.5 * np.einsum(
-            'ab,abcd,cd->', self.rho_ab, self.U_abcd, self.rho_ab)
+            'ab,abcd,cd->', self.rho_ab, self.U_abcd, self.rho_ab, optimize=True)
         return self.E_int        
         
     # ------------------------------------------------------------------
@@ -273,8 +374,9 @@ class HartreeFockSolver(object):
 
     # ------------------------------------------------------------------
     def solve_iter(self, N_target, M0=None, mu0=None,
-                   nitermax=100, mixing=0.5, tol=1e-9):
-        """ Solve the HF-equations using forward recursion at fixed density.     
+                   nitermax=100, mixing=0.5, tol=1e-9, nhistory=0):
+        """ Solve the HF-equations using forward recursion at fixed density,
+        optionally accelerated with Anderson mixing.
 
         Parameters
         ----------
@@ -292,11 +394,17 @@ class HartreeFockSolver(object):
             Maximal number of self consistent iterations.
 
         mixing : float, optional
-            Linear mixing parameter.
+            Linear mixing parameter (damping of the Anderson step).
 
         tol : float, optional
             Convergence in relative change of the density matrix.
 
+        nhistory : int, optional
+            Number of previous iterations used in the Anderson mixing,
+            ``nhistory=0`` (default) gives plain linear mixing. The history
+            is restarted whenever the residual grows, since the unguarded
+            extrapolation can land on unstable (symmetric) solutions.
+
         Returns
         -------
 
@@ -309,17 +417,21 @@ class HartreeFockSolver(object):
         print('nitermax =', nitermax)
         print('mixing =', mixing)
         print('tol =', tol)
+        print('nhistory =', nhistory)
         print()
         
         assert( mixing >= 0. )
         assert( mixing <= 1. )
+        assert( nhistory >= 0 )
 
         self.mixing = mixing
         self.nitermax = nitermax
+        self.nhistory = nhistory
         
         rho_vec = self.solve_setup(N_target, M0, mu0)
 
         rho_iter = []
+        rho_hist, res_hist = [], []
         
         for idx in range(self.nitermax):
 
@@ -327,9 +439,10 @@ class HartreeFockSolver(object):
 
             rho_vec_old = np.copy(rho_vec)
             rho_vec_new = self.density_matrix_step(rho_vec, N_target)
+            res_vec = rho_vec_new - rho_vec_old
 
             norm = np.linalg.norm(rho_vec_old)
-            drho = np.linalg.norm(rho_vec_old - rho_vec_new) / norm
+            drho = np.linalg.norm(res_vec) / norm
             
             print('MF: iter, drho = %3i, %2.2E' % (idx, drho))
             
@@ -337,7 +450,25 @@ class HartreeFockSolver(object):
                 print('MF: Converged drho = %3.3E\n' % drho)
                 break
 
-            rho_vec = (1. - mixing) * rho_vec_old + mixing * rho_vec_new
+            # -- Anderson mixing: minimize the residual in the span of the
+            # -- last nhistory iterations, then take a damped step.
+            # -- Restart from a linear mixing step when the residual grows.
+
+            if res_hist and np.linalg.norm(res_vec) > np.linalg.norm(res_hist[-1]):
+                rho_hist, res_hist = [], []
+
+            rho_hist.append(rho_vec_old)
+            res_hist.append(res_vec)
+            del rho_hist[:-(nhistory + 1)], res_hist[:-(nhistory + 1)]
+
+            if len(res_hist) > 1:
+                dX = np.diff(rho_hist, axis=0).T
+                dF = np.diff(res_hist, axis=0).T
+                gamma = np.linalg.lstsq(dF, res_vec, rcond=None)[0]
+                rho_vec_old = rho_vec_old - dX @ gamma
+                res_vec = res_vec - dF @ gamma
+
+            rho_vec = rho_vec_old + mixing * res_vec
 
         self.update_total_energy()
         print(self.__str__())
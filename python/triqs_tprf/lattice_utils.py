@@ -291,7 +291,8 @@ def chi_contraction(chi, op1, op2):
                          ' must fit the shape of chi %s.'%(chi.target_shape,))
 
     chi_op1op2 = chi[0, 0, 0, 0].copy()
-    chi_op1op2.data[:] = np.einsum('...abcd,ab,cd->...', chi.data, op1, op2)
+    chi_op1op2.data[:] = np.einsum('...abcd,ab,cd->...', chi.data, op1, op2,
+                                   optimize=True)
 
     return chi_op1op2
 
@@ -462,7 +463,7 @@ def extend_data_on_boundary(values, nk):
     # -- compute kidx_ext
 
     k_idx_ext = np.array([ X.flatten() for X in Coords ]).T
-    k_vec_rel_ext = np.array(k_idx_ext, dtype=np.float) / nk[None, :]
+    k_vec_rel_ext = np.array(k_idx_ext, dtype=float) / nk[None, :]
     kxe, kye, kze = get_k_components_from_k_vec(k_vec_rel_ext, nk_ext)
 
     return values_ext, k_vec_rel_ext, (kxe, kye, kze)
@@ -12,11 +12,15 @@ Author: H. U.R. Strand (2019)
 """
 
 import itertools
+import functools
 import numpy as np
 #from packaging.version import parse
 from distutils.version import StrictVersion as parse
 
+@functools.lru_cache(maxsize=None)
 def is_numpy_newer_than(version):
+    # -- Cached, the version parsing is otherwise redone on every
+    # -- (batched) linear algebra call below.
     return parse(np.__version__) > parse(version)
 
 def np_linalg_func(arr, func, version='1.8.0'):
@@ -35,16 +35,16 @@ def read_vasp_crpa_vq_to_ndarray(path, prefix, verbose=False, orbsub=[]):
         if(norbsub > 0):
             print('orb subset =', orbsub)
 
-    Q = np.zeros((nq, 3), dtype=np.float)
+    Q = np.zeros((nq, 3), dtype=float)
 
     if(norbsub == 0):
         norbsub = norb
         orbsub = range(norb)
 
-    U_Q = np.zeros((nq, norbsub, norbsub, norbsub, norbsub), dtype=np.complex)
+    U_Q = np.zeros((nq, norbsub, norbsub, norbsub, norbsub), dtype=complex)
     
     for qidx in range(nq):
-        u = np.zeros([norb]*4, dtype=np.complex)
+        u = np.zeros([norb]*4, dtype=complex)
         s, e = qidx * norb**4, (qidx + 1) * norb**4
         np.testing.assert_array_almost_equal(q[s:e] - q[s], np.zeros_like(q[s:e]))
         ijkl, v = idxs[s:e], vals[s:e]
@@ -245,7 +245,7 @@ def parse_orbital_positions_from_wannier90_wout(filename, units):
 
     lines = "".join(lines[idxstart:idxend])
     array = np.genfromtxt(StringIO(lines),  dtype="|U8")
-    array = np.array(array[:,[6,7,8]], dtype=np.float)
+    array = np.array(array[:,[6,7,8]], dtype=float)
     array = np.dot( np.linalg.inv(units.T), array[:,:].T ).T
 
     # -- convert array to list of tuples
@@ -62,10 +62,11 @@ def test_gf_Matsubara(wmesh):
     print("  -> bare Matsubara Gf")
     g0_wk = lattice_dyson_g0_wk(mu=mu, e_k=e_k, mesh=wmesh)
 
+    w_n = np.array([w.value for w in wmesh])
+    iw_mu = (w_n[:, None, None, None] + mu) * np.eye(norb)
+
     g0_wk_ref = Gf(mesh=MeshProduct(wmesh, kmesh), target_shape=[norb]*2)
-    for w in wmesh:
-        for k in kmesh:
-            g0_wk_ref[w,k] = np.linalg.inv( (w.value + mu)*np.eye(norb) - e_k[k] )
+    g0_wk_ref.data[:] = np.linalg.inv( iw_mu - e_k.data[None, ...] )
 
     np.testing.assert_array_almost_equal(g0_wk.data[:], g0_wk_ref.data[:])
 
@@ -113,9 +114,7 @@ def test_gf_Matsubara(wmesh):
     print("  -> lattice_dyson_g_wk, sigma_wk")
     g_wk = lattice_dyson_g_wk(mu=mu, e_k=e_k, sigma_wk=sigma_wk)
     g_wk_ref = Gf(mesh=MeshProduct(wmesh, kmesh), target_shape=[norb]*2)
-    for w in wmesh:
-        for k in kmesh:
-            g_wk_ref[w,k] = np.linalg.inv( (w.value + mu)*np.eye(norb) - e_k[k] - sigma_wk[w,k] )
+    g_wk_ref.data[:] = np.linalg.inv( iw_mu - e_k.data[None, ...] - sigma_wk.data )
     
     np.testing.assert_array_almost_equal(g_wk.data[:], g_wk_ref.data[:])
 
@@ -123,9 +122,8 @@ def test_gf_Matsubara(wmesh):
     print("  -> lattice_dyson_g_wk, sigma_w")
     g_wk_2 = lattice_dyson_g_wk(mu=mu, e_k=e_k, sigma_w=sigma_w)
     g_wk_2_ref = Gf(mesh=MeshProduct(wmesh, kmesh), target_shape=[norb]*2)
-    for w in wmesh:
-        for k in kmesh:
-            g_wk_2_ref[w,k] = np.linalg.inv( (w.value + mu)*np.eye(norb) - e_k[k] - sigma_w[w] )
+    g_wk_2_ref.data[:] = np.linalg.inv(
+        iw_mu - e_k.data[None, ...] - sigma_w.data[:, None, ...] )
     
     np.testing.assert_array_almost_equal(g_wk_2.data[:], g_wk_2_ref.data[:])
 
@@ -134,12 +132,8 @@ def test_gf_Matsubara(wmesh):
     g_w = lattice_dyson_g_w(mu=mu, e_k=e_k, sigma_w=sigma_w)
     
     g_w_ref = Gf(mesh=wmesh, target_shape=[norb]*2)
-    g_w_ref.data[:] = 0.0
-    for w in wmesh:
-        wi = w.data_index
-        for k in kmesh:
-            g_w_ref.data[wi,:] += np.linalg.inv( (w.value + mu)*np.eye(norb) - e_k[k] - sigma_w[w] )
-        # g_w_ref.data[wi,:] += np.sum(g_wk_2_ref.data[wi,:], axis=0)
+    g_w_ref.data[:] = np.sum(np.linalg.inv(
+        iw_mu - e_k.data[None, ...] - sigma_w.data[:, None, ...] ), axis=1)
     g_w_ref.data[:] /= len(kmesh)
     np.testing.assert_array_almost_equal(g_w.data[:], g_w_ref.data[:])
 
@@ -176,11 +170,11 @@ def test_gf_realfreq():
     # Test setup bare Gf
     print("  -> bare real-freq. Gf")
     g0_fk = lattice_dyson_g0_fk(mu=mu, e_k=e_k, mesh=fmesh, delta=delta)
+    f_n = np.array([f.value for f in fmesh])
+    f_mu = (f_n[:, None, None, None] + 1.0j*delta + mu) * np.eye(norb)
+
     g0_fk_ref = Gf(mesh=MeshProduct(fmesh, kmesh), target_shape=[norb]*2)
-    for f in fmesh:
-        for k in kmesh:
-            #g0_fk_ref[f,k] = 1.0 / (f.value + 1.0j*delta - e_k[k] + mu)
-            g0_fk_ref[f,k] = np.linalg.inv( (f.value + 1.0j*delta + mu)*np.eye(norb) - e_k[k] )
+    g0_fk_ref.data[:] = np.linalg.inv( f_mu - e_k.data[None, ...] )
 
     np.testing.assert_array_almost_equal(g0_fk.data[:], g0_fk_ref.data[:])
 
@@ -199,10 +193,7 @@ def test_gf_realfreq():
     print("  -> dressed real-freq. Gf")
     g_fk = lattice_dyson_g_fk(mu=mu, e_k=e_k, sigma_fk=sigma_fk, delta=delta)
     g_fk_ref = Gf(mesh=MeshProduct(fmesh, kmesh), target_shape=[norb]*2)
-    for f in fmesh:
-        for k in kmesh:
-            #g_fk_ref[f,k] = 1.0 / (f.value + 1.0j*delta - e_k[k] + mu - sigma_fk[f,k])
-            g_fk_ref[f,k] = np.linalg.inv( (f.value + 1.0j*delta + mu)*np.eye(norb) - e_k[k] - sigma_fk[f,k] )
+    g_fk_ref.data[:] = np.linalg.inv( f_mu - e_k.data[None, ...] - sigma_fk.data )
     
     np.testing.assert_array_almost_equal(g_fk.data[:], g_fk_ref.data[:])
 
@@ -210,9 +201,8 @@ def test_gf_realfreq():
     print("  -> lattice_dyson_g_fk, sigma_f")
     g_fk_2 = lattice_dyson_g_fk(mu=mu, e_k=e_k, sigma_f=sigma_f, delta=delta)
     g_fk_2_ref = Gf(mesh=MeshProduct(fmesh, kmesh), target_shape=[norb]*2)
-    for f in fmesh:
-        for k in kmesh:
-            g_fk_2_ref[f, k] = np.linalg.inv( (f.value + 1.j *delta + mu)*np.eye(norb) - e_k[k] - sigma_f[f] )
+    g_fk_2_ref.data[:] = np.linalg.inv(
+        f_mu - e_k.data[None, ...] - sigma_f.data[:, None, ...] )
     
     np.testing.assert_array_almost_equal(g_fk_2.data[:], g_fk_2_ref.data[:])
 
@@ -221,11 +211,8 @@ def test_gf_realfreq():
     g_f = lattice_dyson_g_f(mu=mu, e_k=e_k, sigma_f=sigma_f, delta=delta)
     
     g_f_ref = Gf(mesh=fmesh, target_shape=[norb]*2)
-    g_f_ref.data[:] = 0.0
-    for f in fmesh:
-        fi = f.data_index
-        for k in kmesh:
-            g_f_ref.data[fi,:] += np.linalg.inv( (f.value + 1.j*delta + mu)*np.eye(norb) - e_k[k] - sigma_f[f] )
+    g_f_ref.data[:] = np.sum(np.linalg.inv(
+        f_mu - e_k.data[None, ...] - sigma_f.data[:, None, ...] ), axis=1)
     g_f_ref.data[:] /= len(kmesh)
     np.testing.assert_array_almost_equal(g_f.data[:], g_f_ref.data[:])
 
@@ -113,6 +113,15 @@ if __name__ == '__main__':
     
     np.testing.assert_almost_equal(hr.chi0_SzSz, hfr.chi0_SzSz)
     np.testing.assert_almost_equal(hr.chi_SzSz, hfr.chi_SzSz)
+
+    # -- Analytic (Lehmann) response vs finite differences
+
+    hr_lehmann = HartreeResponse(hs)
+    hfr_lehmann = HartreeFockResponse(hs)
+
+    np.testing.assert_almost_equal(hr.chi_SzSz, hr_lehmann.response(Sz, Sz))
+    np.testing.assert_almost_equal(hfr.chi0_abcd, hfr_lehmann.chi0_abcd)
+    np.testing.assert_almost_equal(hfr.chi_abcd, hfr_lehmann.chi_abcd)
     
     # ------------------------------------------------------------------
     # -- Call TPRF chi0_wk bubble calc
@@ -0,0 +1,82 @@
+# ----------------------------------------------------------------------
+
+""" Chemical potential search of the Hartree-Fock solver
+
+Compare the Newton search (and its bracketed brentq fallback) in
+HartreeFockSolver.update_chemical_potential with a plain brentq root
+search of n(mu) = N, for a metal and for a gapped band insulator at
+high and low temperature. """
+
+# ----------------------------------------------------------------------
+
+import warnings
+import numpy as np
+
+from scipy.optimize import brentq
+
+# ----------------------------------------------------------------------
+
+from triqs_tprf.tight_binding import TBLattice
+from triqs_tprf.hf_solver import HartreeFockSolver, fermi
+
+# ----------------------------------------------------------------------
+if __name__ == '__main__':
+
+    n_k = (256, 1, 1)
+    t, Delta = 1.0, 1.0
+
+    # -- One band chain (metal)
+
+    t_r_metal = TBLattice(
+        units = [(1,)],
+        hopping = {
+            (+1,): -t * np.eye(1),
+            (-1,): -t * np.eye(1),
+            },
+        orbital_positions = [(0,0,0)],
+        orbital_names = ['0'],
+        )
+
+    # -- Chain with staggered potential +/- Delta (gap 2 Delta at half filling)
+
+    T = -t * np.array([[0., 0.], [1., 0.]])
+
+    t_r_gap = TBLattice(
+        units = [(1,)],
+        hopping = {
+            (0,): np.array([[Delta, -t], [-t, -Delta]]),
+            (+1,): T,
+            (-1,): T.T,
+            },
+        orbital_positions = [(0,0,0)] * 2,
+        orbital_names = ['A', 'B'],
+        )
+
+    # -- Newton warnings other than the zero derivative have to propagate
+    warnings.simplefilter('error', RuntimeWarning)
+
+    for name, t_r, N in [('metal', t_r_metal, 0.6), ('gap', t_r_gap, 1.0)]:
+
+        e_k = t_r.fourier(t_r.get_kmesh(n_k))
+        e = np.linalg.eigvalsh(e_k.data).flatten()
+        nk = len(e_k.mesh)
+
+        for beta in [10., 1000.]:
+
+            def n_mu(mu): return np.sum(fermi(e - mu, beta)) / nk - N
+
+            mu_ref = brentq(n_mu, e.min(), e.max(), xtol=1e-14)
+
+            for mu0 in [0., 0.3, -2.5]:
+
+                hs = HartreeFockSolver(e_k, beta)
+                hs.update_chemical_potential(N, mu0=mu0)
+
+                print(name, 'beta, mu0 =', beta, mu0)
+                print('mu, mu_ref =', hs.mu, mu_ref)
+
+                np.testing.assert_almost_equal(n_mu(hs.mu), 0., decimal=10)
+                np.testing.assert_almost_equal(hs.mu, mu_ref, decimal=8)
+
+                if name == 'gap':
+                    assert( np.abs(hs.mu) < Delta )
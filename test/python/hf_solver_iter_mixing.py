@@ -0,0 +1,90 @@
+# ----------------------------------------------------------------------
+
+""" One dimensional Hubbard model solved with Hartree-Fock forward
+iteration, comparing linear and Anderson mixing.
+
+Starting from random symmetry breaking seeds of the mean field, the
+Anderson accelerated iteration has to reach the same symmetry broken
+(AF for U > 0, CDW for U < 0) solution as plain linear mixing, and not
+the unstable symmetric solution at half filling. """
+
+# ----------------------------------------------------------------------
+
+import numpy as np
+
+# ----------------------------------------------------------------------
+
+from triqs.operators import n
+
+# ----------------------------------------------------------------------
+
+from triqs_tprf.tight_binding import TBLattice
+from triqs_tprf.super_lattice import TBSuperLattice
+
+from triqs_tprf.hf_solver import HartreeFockSolver
+
+# ----------------------------------------------------------------------
+if __name__ == '__main__':
+
+    N_tot = 2.
+    n_k = (64, 1, 1)
+
+    # -- One dimensional tight binding model, two site super cell
+
+    t = 1.0
+    h_loc = np.zeros((2, 2))
+    T = - t * np.eye(2)
+
+    t_r_prim = TBLattice(
+        units = [(1,)],
+        hopping = {
+            # nearest neighbour hopping -t
+            (0,): h_loc,
+            (+1,): T,
+            (-1,): T,
+            },
+        orbital_positions = [(0,0,0)] * 2,
+        orbital_names = ['up', 'do'],
+        )
+
+    t_r = TBSuperLattice(t_r_prim, np.array([[ 2 ]]))
+
+    kmesh = t_r.get_kmesh(n_k)
+    e_k = t_r.fourier(kmesh)
+
+    gf_struct = [[0, 4]]
+    docc = n(0, 0) * n(0, 2) + n(0, 1) * n(0, 3)
+
+    rng = np.random.default_rng(seed=1234)
+
+    for U in [3., 6., -3., -6.]:
+        for beta in [10., 50.]:
+
+            print('-'*72)
+            print('U, beta =', U, beta)
+            print('-'*72)
+
+            M0 = np.diag(rng.normal(size=4))
+
+            res = []
+            for nhistory in [0, 5]:
+                hs = HartreeFockSolver(
+                    e_k, beta, H_int=U * docc, gf_struct=gf_struct)
+                hs.solve_iter(N_target=N_tot, M0=M0, mu0=0.5*U,
+                              nitermax=500, tol=1e-10, nhistory=nhistory)
+                res.append(hs)
+
+            hs_lin, hs_and = res
+
+            print('rho (linear)   =', np.diag(hs_lin.rho_ab).real)
+            print('rho (Anderson) =', np.diag(hs_and.rho_ab).real)
+            print('Omega (linear), Omega (Anderson) =', hs_lin.Omega, hs_and.Omega)
+
+            # -- Linear mixing breaks the symmetry from the random seed
+            assert( np.max(np.abs(np.diag(hs_lin.rho_ab).real - 0.5)) > 0.1 )
+
+            # -- Compare up to the degenerate (sublattice/spin flipped) domains
+            np.testing.assert_array_almost_equal(
+                np.sort(np.diag(hs_lin.rho_ab).real),
+                np.sort(np.diag(hs_and.rho_ab).real), decimal=6)
+            np.testing.assert_almost_equal(hs_lin.Omega, hs_and.Omega, decimal=6)